@@ -3,10 +3,11 @@ from utils.data_processing import DataProcessor
 from utils.advanced_analytics import AdvancedAnalytics
 from config import SPOTIFY_CONFIG, MARKETS, COLLECTION_CONFIG
 import logging
-from typing import Dict
+from typing import Dict, Optional
 import os
 import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 logging.basicConfig(
     level=logging.INFO,
@@ -14,97 +15,100 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+ANALYTICS_DIR = 'market_analytics'
+
 class MarketAnalyzer:
-    def __init__(self):
+    def __init__(self, requests_per_second: Optional[float] = None):
         """Initialize market analyzer with Spotify client and data processor"""
         self.spotify_client = SpotifyClient(
             SPOTIFY_CONFIG['client_id'],
-            SPOTIFY_CONFIG['client_secret']
+            SPOTIFY_CONFIG['client_secret'],
+            genre_cache_dir=COLLECTION_CONFIG['genre_cache_dir'],
+            requests_per_second=requests_per_second or COLLECTION_CONFIG['requests_per_second']
         )
         self.data_processor = DataProcessor(
             COLLECTION_CONFIG['raw_data_dir'],
             COLLECTION_CONFIG['processed_data_dir']
         )
-        self.analytics = AdvancedAnalytics()
-        self.analytics_dir = 'market_analytics'
+        self.analytics = AdvancedAnalytics(COLLECTION_CONFIG['analytics_cache_dir'])
+        self.analytics_dir = ANALYTICS_DIR
+        self.max_workers = COLLECTION_CONFIG['max_workers']
         os.makedirs(self.analytics_dir, exist_ok=True)
 
     def analyze_market(self, market_code: str) -> Dict:
         """Run complete market analysis for a specific country"""
         try:
-            logger.info(f"Starting analysis for market: {MARKETS[market_code]['name']}")
-            
-            #Market config
-            market_size = {
-                'IN': 1000000,
-                'JP': 800000,
-                'ID': 600000
-            }.get(market_code, 500000)
+            market_config = MARKETS[market_code]
+            logger.info(f"Starting analysis for market: {market_config['name']}")
             
-            competition_level = {
-                'IN': 0.6,
-                'JP': 0.8,
-                'ID': 0.5
-            }.get(market_code, 0.5)
+            #One timestamp shared by the raw, processed and insights files
+            started_at = datetime.now()
+            timestamp = started_at.strftime('%Y%m%d_%H%M%S')
             
             #Get playlists
             playlists = self.spotify_client.get_market_playlists(
                 market_code,
-                MARKETS[market_code]['playlists_limit']
+                market_config['playlists_limit']
             )
             
             if not playlists:
                 logger.warning(f"No playlists found for market {market_code}")
                 return {
-                    'market': MARKETS[market_code]['name'],
+                    'market': market_config['name'],
                     'playlists': [],
                     'genre_analysis': {},
                     'market_insights': {}
                 }
             
-            #Process playlists
+            #Process playlists, fetching tracks concurrently since the calls are I/O bound.
+            #Playlists are streamed to the raw JSONL file from this thread as they arrive
+            playlists = [playlist for playlist in playlists if isinstance(playlist, dict)]
             processed_playlists = []
-            for playlist in playlists:
-                if not isinstance(playlist, dict):
-                    continue
-                    
-                tracks = self.spotify_client.get_playlist_tracks(playlist['id'])
+            raw_filepath = None
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                playlist_tracks = executor.map(
+                    lambda playlist: self.spotify_client.get_playlist_tracks(playlist['id']),
+                    playlists
+                )
                 
-                if tracks:
-                    processed_playlist = {
-                        'name': playlist.get('name', 'Unknown'),
-                        'id': playlist.get('id', 'Unknown'),
-                        'description': playlist.get('description', ''),
-                        'followers': playlist.get('followers', {}).get('total', 0),
-                        'tracks': tracks
-                    }
-                    processed_playlists.append(processed_playlist)
-            
-            #Save raw data
+                for playlist, tracks in zip(playlists, playlist_tracks):
+                    if tracks:
+                        processed_playlist = {
+                            'name': playlist.get('name', 'Unknown'),
+                            'id': playlist.get('id', 'Unknown'),
+                            'description': playlist.get('description', ''),
+                            'followers': playlist.get('followers_total', 0),
+                            'tracks': tracks
+                        }
+                        processed_playlists.append(processed_playlist)
+                        raw_filepath = self.data_processor.append_raw_playlist(
+                            processed_playlist, market_code, timestamp
+                        )
+            
             market_data = {
-                'market': MARKETS[market_code]['name'],
+                'market': market_config['name'],
                 'playlists': processed_playlists,
-                'timestamp': datetime.now().isoformat()
+                'timestamp': started_at.isoformat()
             }
             
-            raw_filepath = self.data_processor.save_raw_data(market_data, market_code)
-            logger.info(f"Raw data saved to: {raw_filepath}")
+            if raw_filepath:
+                logger.info(f"Raw data saved to: {raw_filepath}")
             
             #Process and analyze data
             df = self.data_processor.process_playlist_data(processed_playlists)
-            processed_filepath = self.data_processor.save_processed_data(df, market_code)
+            processed_filepath = self.data_processor.save_processed_data(df, market_code, timestamp)
             logger.info(f"Processed data saved to: {processed_filepath}")
             
             #Generate advanced insights
             market_insights = self.analytics.generate_market_insights(
                 df,
                 market_code,
-                market_size,
-                competition_level
+                market_config['market_size'],
+                market_config['competition_level'],
+                market_config['analysis_depth']
             )
             
             #Save the generated insights
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             insights_file = f"{self.analytics_dir}/{market_code}_insights_{timestamp}.json"
             with open(insights_file, 'w') as f:
                 json.dump(market_insights, f, indent=2)
@@ -131,31 +135,52 @@ class MarketAnalyzer:
             logger.error(f"Error analyzing market {market_code}: {str(e)}")
             raise
 
+def analyze_market_worker(market_code: str, requests_per_second: float) -> Dict:
+    """Analyze one market in a worker process, building the clients there.
+
+    Only the summary the driver reports is sent back, not the fetched tracks.
+    """
+    market_data = MarketAnalyzer(requests_per_second).analyze_market(market_code)
+    return {
+        'playlist_count': len(market_data.get('playlists', [])),
+        'genre_analysis': market_data.get('genre_analysis', {}),
+        'summary': market_data.get('market_insights', {}).get('summary', {})
+    }
+
 if __name__ == "__main__":
-    analyzer = MarketAnalyzer()
-    
-    for market_code in MARKETS.keys():
-        try:
-            result = analyzer.analyze_market(market_code)
-            
-            #Completion status log 
-            playlist_count = len(result.get('playlists', []))
-            genre_analysis = result.get('genre_analysis', {})
-            market_insights = result.get('market_insights', {})
-            
-            print(f"\n{'='*50}")
-            print(f"MARKET ANALYSIS: {market_code}")
-            print(f"{'='*50}")
-            
-            print(f"\nBasic Metrics:")
-            print(f"- Processed {playlist_count} playlists")
-            print(f"- Found {genre_analysis.get('unique_genres', 0)} unique genres")
-            print(f"- Analyzed {genre_analysis.get('total_tracks', 0)} tracks")
-            
-            print(f"\nMarket Insights:")
-            print(f"- Opportunity Score: {market_insights['summary']['opportunity_score']}")
-            print(f"- Key Gaps: {', '.join(market_insights['summary']['key_gaps'])}")
-            print(f"- Results saved to: {analyzer.analytics_dir}/{market_code}_insights_*.json")
-            
-        except Exception as e:
-            logger.error(f"Failed to analyze market {market_code}: {str(e)}")
\ No newline at end of file
+    #Markets are independent, so each one runs in its own process
+    max_workers = min(len(MARKETS), os.cpu_count() or 1)
+    #Each process has its own client, so they split the API budget
+    requests_per_second = COLLECTION_CONFIG['requests_per_second'] / max_workers
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(analyze_market_worker, market_code, requests_per_second): market_code
+            for market_code in MARKETS
+        }
+        
+        for future in as_completed(futures):
+            market_code = futures[future]
+            try:
+                result = future.result()
+            
+                #Completion status log 
+                playlist_count = result['playlist_count']
+                genre_analysis = result['genre_analysis']
+                summary = result['summary']
+            
+                print(f"\n{'='*50}")
+                print(f"MARKET ANALYSIS: {market_code}")
+                print(f"{'='*50}")
+            
+                print(f"\nBasic Metrics:")
+                print(f"- Processed {playlist_count} playlists")
+                print(f"- Found {genre_analysis.get('unique_genres', 0)} unique genres")
+                print(f"- Analyzed {genre_analysis.get('total_tracks', 0)} tracks")
+            
+                print(f"\nMarket Insights:")
+                print(f"- Opportunity Score: {summary['opportunity_score']}")
+                print(f"- Key Gaps: {', '.join(summary['key_gaps'])}")
+                print(f"- Results saved to: {ANALYTICS_DIR}/{market_code}_insights_*.json")
+            
+            except Exception as e:
+                logger.error(f"Failed to analyze market {market_code}: {str(e)}")
\ No newline at end of file
@@ -1,10 +1,26 @@
-import json
+import orjson
 import plotly.graph_objs as go
 import pandas as pd
+import numpy as np
+from pathlib import Path
 
 #IMPORTANT Add your market_analytics JSON filename instead of "IN_insights_20250426_080010.json"
-with open('market_analytics/IN_insights_20250426_080010.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
+with open('market_analytics/IN_insights_20250426_080010.json', 'rb') as file:
+    data = orjson.loads(file.read())
+
+def _json_default(obj):
+    """Fallback for arrays orjson cannot serialize natively (e.g. object dtype)"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError
+
+def figure_to_json(fig: go.Figure) -> str:
+    """Serialize a figure for Plotly.newPlot with orjson"""
+    return orjson.dumps(
+        fig.to_plotly_json(),
+        option=orjson.OPT_SERIALIZE_NUMPY,
+        default=_json_default
+    ).decode()
 
 def create_market_analysis_dashboard():
     """Generates an HTML dashboard"""
@@ -152,16 +168,15 @@ def create_market_analysis_dashboard():
         </div>
 
         <script>
-            Plotly.newPlot('genre-diversity', {genre_diversity_fig.to_json()});
-            Plotly.newPlot('content-gaps', {content_gaps_fig.to_json()});
-            Plotly.newPlot('top-genres', {top_genres_fig.to_json()});
+            Plotly.newPlot('genre-diversity', {figure_to_json(genre_diversity_fig)});
+            Plotly.newPlot('content-gaps', {figure_to_json(content_gaps_fig)});
+            Plotly.newPlot('top-genres', {figure_to_json(top_genres_fig)});
         </script>
     </body>
     </html>
     """
 
-    with open('outputs/india_music_market_dashboard.html', 'w', encoding='utf-8') as f:
-        f.write(dashboard_html)
+    Path('outputs/india_music_market_dashboard.html').write_bytes(dashboard_html.encode('utf-8'))
 
     print("Dashboard is saved as india_music_market_dashboard.html")
 
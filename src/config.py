@@ -1,4 +1,5 @@
 import os
+from types import MappingProxyType
 from dotenv import load_dotenv
 
 #Load environment variables
@@ -11,18 +12,23 @@ SPOTIFY_CONFIG = {
 }
 
 #Config for analyzing the market. India and Japan
-MARKETS = {
-    'IN': {
+#Read-only so market settings stay constant for the whole run
+MARKETS = MappingProxyType({
+    'IN': MappingProxyType({
         'name': 'India',
         'playlists_limit': 50,
-        'analysis_depth': 'deep'
-    },
-    'JP': {
+        'analysis_depth': 'deep',
+        'market_size': 1000000,
+        'competition_level': 0.6
+    }),
+    'JP': MappingProxyType({
         'name': 'Japan',
         'playlists_limit': 50,
-        'analysis_depth': 'deep'
-    }
-}
+        'analysis_depth': 'deep',
+        'market_size': 800000,
+        'competition_level': 0.8
+    })
+})
 
 #Config for data collection
 COLLECTION_CONFIG = {
@@ -30,5 +36,10 @@ COLLECTION_CONFIG = {
     'save_raw_data': True,
     'data_directory': 'collected_data',
     'raw_data_dir': 'collected_data/raw_data',
-    'processed_data_dir': 'collected_data/processed_data'
+    'processed_data_dir': 'collected_data/processed_data',
+    'analytics_cache_dir': '.cache/analytics',
+    'genre_cache_dir': '~/.cache/spotify-market-analysis/genres',
+    'max_workers': 8,
+    #Spotify API budget for the whole run, split across market processes
+    'requests_per_second': 10
 }
\ No newline at end of file
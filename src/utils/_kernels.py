@@ -0,0 +1,77 @@
+from numba import njit
+import numpy as np
+
+#Not cached on disk: the module is imported as both utils._kernels and
+#src.utils._kernels, and a cached overload only loads under the name it was built with
+@njit
+def lloyd2d(points: np.ndarray, k: int, n_iter: int) -> np.ndarray:
+    """Run k-means++ seeded Lloyd iterations on (n, 2) float32 points"""
+    n = points.shape[0]
+    np.random.seed(0)
+    centers = np.empty((k, 2), dtype=np.float32)
+
+    #k-means++ initialization
+    centers[0] = points[np.random.randint(n)]
+    dist = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        dx = points[i, 0] - centers[0, 0]
+        dy = points[i, 1] - centers[0, 1]
+        dist[i] = dx * dx + dy * dy
+
+    for c in range(1, k):
+        total = dist.sum()
+        chosen = n - 1
+        if total > 0.0:
+            target = np.random.random() * total
+            cumulative = 0.0
+            for i in range(n):
+                cumulative += dist[i]
+                if cumulative >= target:
+                    chosen = i
+                    break
+        else:
+            chosen = np.random.randint(n)
+        centers[c] = points[chosen]
+
+        for i in range(n):
+            dx = points[i, 0] - centers[c, 0]
+            dy = points[i, 1] - centers[c, 1]
+            d = dx * dx + dy * dy
+            if d < dist[i]:
+                dist[i] = d
+
+    #Lloyd iterations
+    labels = np.full(n, -1, dtype=np.int64)
+    sums = np.zeros((k, 2), dtype=np.float64)
+    counts = np.zeros(k, dtype=np.int64)
+    for _ in range(n_iter):
+        changed = False
+        for i in range(n):
+            best = 0
+            best_dist = np.inf
+            for c in range(k):
+                dx = points[i, 0] - centers[c, 0]
+                dy = points[i, 1] - centers[c, 1]
+                d = dx * dx + dy * dy
+                if d < best_dist:
+                    best_dist = d
+                    best = c
+            if labels[i] != best:
+                labels[i] = best
+                changed = True
+
+        if not changed:
+            break
+
+        sums[:] = 0.0
+        counts[:] = 0
+        for i in range(n):
+            sums[labels[i], 0] += points[i, 0]
+            sums[labels[i], 1] += points[i, 1]
+            counts[labels[i]] += 1
+        for c in range(k):
+            if counts[c] > 0:
+                centers[c, 0] = sums[c, 0] / counts[c]
+                centers[c, 1] = sums[c, 1] / counts[c]
+
+    return labels
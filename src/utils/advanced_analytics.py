@@ -1,12 +1,49 @@
-from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
+from joblib import Memory
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from collections import defaultdict
+import hashlib
+import inspect
+import re
+from ._kernels import lloyd2d
+
+#Below this many genres, clustering falls back to popularity quantile buckets
+MIN_GENRES_FOR_KMEANS = 20
+
+#joblib only hashes _fit_clusters' own source, so cached fits are also
+#keyed on the kernel's source to invalidate them when lloyd2d changes
+_KERNEL_KEY = hashlib.sha1(inspect.getsource(lloyd2d.py_func).encode()).hexdigest()
+
+def _fit_clusters(genres_data: np.ndarray, n_clusters: int, kernel_key: str) -> np.ndarray:
+    """Normalize genre statistics and assign each genre to a cluster"""
+    genres_normalized = StandardScaler().fit_transform(genres_data)
+    return lloyd2d(
+        np.ascontiguousarray(genres_normalized, dtype=np.float32),
+        n_clusters,
+        20
+    )
+
+def _opportunity_score(
+    avg_popularity,
+    genre_diversity,
+    growth_potential,
+    local_percentage
+):
+    """Weighted opportunity score (0-100) for scalars or equal-length arrays"""
+    return (
+        0.3 * (avg_popularity / 100) + 
+        0.2 * genre_diversity +       
+        0.3 * growth_potential +        
+        0.2 * (local_percentage / 100) 
+    ) * 100
 
 class AdvancedAnalytics:
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = None):
+        """Initialize analytics, caching cluster fits in cache_dir if given"""
+        self._memory = Memory(cache_dir, verbose=0)
+        self._fit_clusters = self._memory.cache(_fit_clusters)
         self.genre_categories = {
             'classical': ['classical', 'orchestra', 'symphonic'],
             'electronic': ['edm', 'electronic', 'dance', 'house', 'techno'],
@@ -19,56 +56,100 @@ class AdvancedAnalytics:
                 'JP': ['j-pop', 'j-rock', 'anime', 'japanese'],
             }
         }
+        #Compile local genre matchers once per market
+        self._local_patterns = {
+            market: re.compile(
+                r'\b(?:' + '|'.join(map(re.escape, genres)) + r')\b',
+                re.IGNORECASE
+            )
+            for market, genres in self.genre_categories['regional'].items()
+        }
+
+    def _explode_genres(self, df: pd.DataFrame) -> pd.Series:
+        """Split the genres column into one categorical row per (track, genre) pair.
 
-    def cluster_genres(self, df: pd.DataFrame, n_clusters: int = 5) -> Dict:
+        The result is indexed by row position in df, so it stays aligned when
+        df has a duplicate index (e.g. concatenated daily runs).
+        """
+        if 'genre_tokens' in df.columns:
+            exploded = df['genre_tokens'].reset_index(drop=True).explode()
+        else:
+            exploded = df['genres'].reset_index(drop=True).fillna('').str.split(', ').explode()
+        codes, genres = pd.factorize(exploded.to_numpy())
+        #Tracks without any genre token come out as NaN (-1), they have no genre to count
+        has_genre = codes >= 0
+        return pd.Series(
+            pd.Categorical.from_codes(codes[has_genre], genres),
+            index=exploded.index[has_genre]
+        )
+
+    def _count_genres(self, genres_exploded: pd.Series) -> pd.Series:
+        """Count tracks per genre from the categorical codes"""
+        categories = genres_exploded.cat.categories
+        return pd.Series(
+            np.bincount(genres_exploded.cat.codes.to_numpy(), minlength=len(categories)),
+            index=pd.Index(categories, dtype=object)
+        )
+
+    def cluster_genres(
+        self,
+        df: pd.DataFrame,
+        n_clusters: int = 5,
+        genres_exploded: Optional[pd.Series] = None,
+        include_tracks: bool = True
+    ) -> Dict:
         """Cluster genres based on popularity and engagement patterns"""
-        genre_stats = defaultdict(lambda: {
-            'count': 0,
-            'avg_popularity': 0,
-            'tracks': []
-        })
-
-        #Aggregate genre statistics
-        for _, row in df.iterrows():
-            genres = str(row['genres']).split(', ')
-            popularity = row['popularity']
-            
-            for genre in genres:
-                genre_stats[genre]['count'] += 1
-                genre_stats[genre]['avg_popularity'] += popularity
-                genre_stats[genre]['tracks'].append(row['track_id'])
+        if df.empty:
+            return {}
 
-        #Clustering prep
-        genres_data = []
-        genre_names = []
-        
-        for genre, stats in genre_stats.items():
-            if stats['count'] > 0:
-                genres_data.append([
-                    stats['count'],
-                    stats['avg_popularity'] / stats['count']
-                ])
-                genre_names.append(genre)
-
-        if not genres_data:
+        if genres_exploded is None:
+            genres_exploded = self._explode_genres(df)
+
+        #Aggregate genre statistics over integer genre codes, pulling track
+        #columns by the row positions the exploded genres carry
+        rows = genres_exploded.index.to_numpy()
+        codes = genres_exploded.cat.codes.to_numpy()
+        genre_names = genres_exploded.cat.categories
+
+        if not len(genre_names):
             return {}
 
-        scaler = StandardScaler()
-        genres_normalized = scaler.fit_transform(genres_data)
+        counts = np.bincount(codes)
+        popularity_sums = np.bincount(
+            codes,
+            weights=df['popularity'].to_numpy(dtype=np.float64)[rows]
+        )
+
+        #Clustering prep
+        genres_data = np.column_stack([counts, popularity_sums / counts])
 
-        kmeans = KMeans(n_clusters=min(n_clusters, len(genres_normalized)))
-        clusters = kmeans.fit_predict(genres_normalized)
+        n_clusters = min(n_clusters, len(genres_data))
+        if len(genres_data) < MIN_GENRES_FOR_KMEANS:
+            #Too few genres for k-means to pay off, bucket by popularity quantiles
+            popularity = genres_data[:, 1]
+            edges = np.quantile(popularity, np.linspace(0, 1, n_clusters + 1))
+            clusters = np.clip(np.digitize(popularity, edges[1:-1]), 0, n_clusters - 1)
+        else:
+            clusters = self._fit_clusters(genres_data, n_clusters, _KERNEL_KEY)
+
+        #Track lists are only materialized when requested
+        genre_tracks = (
+            pd.Series(df['track_id'].to_numpy()[rows]).groupby(codes).agg(list).tolist()
+            if include_tracks else None
+        )
 
         clustered_genres = defaultdict(list)
-        for genre, cluster, (count, avg_pop) in zip(
-            genre_names, clusters, genres_data
+        for code, (genre, cluster, (count, avg_pop)) in enumerate(
+            zip(genre_names, clusters, genres_data)
         ):
-            clustered_genres[f"cluster_{cluster}"].append({
+            genre_info = {
                 'genre': genre,
                 'count': int(count),
-                'popularity': float(avg_pop),
-                'tracks': genre_stats[genre]['tracks']
-            })
+                'popularity': float(avg_pop)
+            }
+            if genre_tracks is not None:
+                genre_info['tracks'] = genre_tracks[code]
+            clustered_genres[f"cluster_{cluster}"].append(genre_info)
 
         return dict(clustered_genres)
 
@@ -77,21 +158,32 @@ class AdvancedAnalytics:
         df: pd.DataFrame, 
         market_code: str,
         market_size: int,
-        competition_level: float
+        competition_level: float,
+        genres_exploded: Optional[pd.Series] = None,
+        genre_counts: Optional[pd.Series] = None
     ) -> Dict:
         """Calculate market opportunity score based on multiple factors"""
         if df.empty:
             return {}
 
+        if genres_exploded is None:
+            genres_exploded = self._explode_genres(df)
+        if genre_counts is None:
+            genre_counts = self._count_genres(genres_exploded)
         total_tracks = len(df)
-        unique_genres = len(set(','.join(df['genres'].fillna('')).split(',')))
+        unique_genres = genre_counts.size
         avg_popularity = df['popularity'].mean()
         
-        local_genres = self.genre_categories['regional'].get(market_code, [])
-        local_content = df[
-            df['genres'].str.contains('|'.join(local_genres), case=False, na=False)
-        ]
-        local_percentage = (len(local_content) / total_tracks * 100) if total_tracks > 0 else 0
+        #Match local genres once per distinct genre, then map back through the codes
+        local_pattern = self._local_patterns.get(market_code)
+        if local_pattern is not None:
+            local_codes = np.asarray(genres_exploded.cat.categories.str.contains(local_pattern), dtype=bool)
+            is_local = local_codes[genres_exploded.cat.codes.to_numpy()]
+            #Index holds row positions, so distinct values are distinct tracks
+            local_tracks = genres_exploded.index[is_local].nunique()
+        else:
+            local_tracks = 0
+        local_percentage = (local_tracks / total_tracks * 100) if total_tracks > 0 else 0
 
         market_penetration = min(1.0, total_tracks / market_size)
         
@@ -100,12 +192,9 @@ class AdvancedAnalytics:
 
         growth_potential = (1 - market_penetration) * (1 - competition_level)
 
-        opportunity_score = (
-            0.3 * (avg_popularity / 100) + 
-            0.2 * genre_diversity +       
-            0.3 * growth_potential +        
-            0.2 * (local_percentage / 100) 
-        ) * 100
+        opportunity_score = _opportunity_score(
+            avg_popularity, genre_diversity, growth_potential, local_percentage
+        )
 
         return {
             'opportunity_score': round(opportunity_score, 2),
@@ -125,63 +214,65 @@ class AdvancedAnalytics:
     def analyze_content_gaps(
         self, 
         df: pd.DataFrame, 
-        market_code: str
+        market_code: str,
+        genre_counts: Optional[pd.Series] = None
     ) -> Dict:
         """Identify content gaps and opportunities."""
         if df.empty:
             return {}
 
-        all_genres = ','.join(df['genres'].fillna('')).split(',')
-        genre_counts = pd.Series(all_genres).value_counts()
+        if genre_counts is None:
+            genre_counts = self._count_genres(self._explode_genres(df))
         total_tracks = len(df)
         
-        genre_representation = {
-            genre: (count / total_tracks * 100)
-            for genre, count in genre_counts.items()
-        }
+        genre_representation = genre_counts / total_tracks * 100
 
-        #Gaps by category
-        gaps = []
-        for category, genres in self.genre_categories.items():
-            if category == 'regional':
-                continue
-                
-            category_genres = set(genres)
-            present_genres = set(genre_counts.index) & category_genres
-            
-            if not present_genres:
-                gap_size = 100
-                status = 'missing'
-            else:
-                representation = sum(
-                    genre_representation.get(genre, 0)
-                    for genre in present_genres
-                )
-                gap_size = max(0, 100 - representation)
-                status = 'underrepresented' if gap_size > 50 else 'present'
+        #Gaps by category, scored for all categories in one pass
+        categories = [c for c in self.genre_categories if c != 'regional']
+        category_genres = [self.genre_categories[c] for c in categories]
+        flat_genres = [genre for genres in category_genres for genre in genres]
+        bounds = np.cumsum([0] + [len(genres) for genres in category_genres])
 
+        genre_rep = genre_representation.reindex(
+            flat_genres, fill_value=0
+        ).to_numpy(dtype=float)
+        present_mask = genre_rep > 0
+
+        representations = np.add.reduceat(genre_rep, bounds[:-1])
+        present_counts = np.add.reduceat(present_mask.astype(np.int32), bounds[:-1])
+        gap_sizes = np.maximum(0., 100. - representations)
+        statuses = np.where(
+            present_counts == 0,
+            'missing',
+            np.where(gap_sizes > 50, 'underrepresented', 'present')
+        )
+
+        gaps = []
+        for category, start, end, gap_size, status in zip(
+            categories, bounds[:-1], bounds[1:], gap_sizes.tolist(), statuses.tolist()
+        ):
+            genres = flat_genres[start:end]
+            mask = present_mask[start:end]
             gaps.append({
                 'category': category,
                 'gap_size': round(gap_size, 2),
                 'status': status,
-                'present_genres': list(present_genres),
-                'missing_genres': list(category_genres - present_genres)
+                'present_genres': [g for g, present in zip(genres, mask) if present],
+                'missing_genres': [g for g, present in zip(genres, mask) if not present]
             })
 
         #Local content gaps 
-        local_genres = set(self.genre_categories['regional'].get(market_code, []))
-        present_local = set(genre_counts.index) & local_genres
-        local_representation = sum(
-            genre_representation.get(genre, 0)
-            for genre in present_local
-        )
+        local_genres = self.genre_categories['regional'].get(market_code, [])
+        local_rep = genre_representation.reindex(local_genres, fill_value=0)
+        present_local = local_rep.index[local_rep > 0].tolist()
+        local_representation = float(local_rep.sum())
 
         return {
             'genre_gaps': sorted(gaps, key=lambda x: x['gap_size'], reverse=True),
             'local_content': {
                 'representation': round(local_representation, 2),
-                'present_genres': list(present_local),
-                'missing_genres': list(local_genres - present_local)
+                'present_genres': present_local,
+                'missing_genres': local_rep.index[local_rep == 0].tolist()
             },
             'recommendations': [
                 gap for gap in gaps 
@@ -194,14 +285,29 @@ class AdvancedAnalytics:
         df: pd.DataFrame,
         market_code: str,
         market_size: int,
-        competition_level: float
+        competition_level: float,
+        analysis_depth: str = 'deep'
     ) -> Dict:
         """Generate comprehensive market insights"""
-        clusters = self.cluster_genres(df)
+        #Explode and count genres once, shared by all analyses below
+        total_tracks = len(df)
+        if df.empty:
+            genres_exploded = pd.Series(pd.Categorical([]))
+        else:
+            genres_exploded = self._explode_genres(df)
+        genre_counts = self._count_genres(genres_exploded)
+
+        clusters = self.cluster_genres(
+            df,
+            genres_exploded=genres_exploded,
+            include_tracks=analysis_depth == 'deep'
+        )
         opportunity = self.calculate_opportunity_score(
-            df, market_code, market_size, competition_level
+            df, market_code, market_size, competition_level,
+            genres_exploded=genres_exploded,
+            genre_counts=genre_counts
         )
-        gaps = self.analyze_content_gaps(df, market_code)
+        gaps = self.analyze_content_gaps(df, market_code, genre_counts=genre_counts)
 
         return {
             'market_code': market_code,
@@ -210,8 +316,8 @@ class AdvancedAnalytics:
             'gap_analysis': gaps,
             'summary': {
                 'opportunity_score': opportunity.get('opportunity_score', 0),
-                'total_tracks': len(df),
-                'unique_genres': len(set(','.join(df['genres'].fillna('')).split(','))),
+                'total_tracks': total_tracks,
+                'unique_genres': genre_counts.size,
                 'key_gaps': [gap['category'] for gap in gaps.get('recommendations', [])]
             }
         }
\ No newline at end of file
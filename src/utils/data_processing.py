@@ -1,14 +1,20 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
 import logging
-import json
+import orjson
 from datetime import datetime
 import os
 from collections import defaultdict
+from dataclasses import is_dataclass
+from functools import partial
 
 logger = logging.getLogger(__name__)
 
+def _is_track(track) -> bool:
+    """Tracks arrive as dicts, or as Track records straight from the client"""
+    return isinstance(track, dict) or is_dataclass(track)
+
 class DataProcessor:
     def __init__(self, raw_data_dir: str, processed_data_dir: str):
         """Initialize data processor with directory paths"""
@@ -17,79 +23,146 @@ class DataProcessor:
         os.makedirs(raw_data_dir, exist_ok=True)
         os.makedirs(processed_data_dir, exist_ok=True)
 
-    def save_raw_data(self, data: Dict, market_code: str) -> str:
-        """Save raw data to JSON file"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{market_code}_raw_{timestamp}.json"
-        filepath = os.path.join(self.raw_data_dir, filename)
+    def _raw_data_path(self, market_code: str, timestamp: str) -> str:
+        """Path of the raw JSONL file for a market run"""
+        return os.path.join(self.raw_data_dir, f"{market_code}_raw_{timestamp}.jsonl")
+
+    def _raw_record(self, playlist: Dict, market_code: str, timestamp: str) -> bytes:
+        """Serialize one playlist as a JSONL line"""
+        return orjson.dumps(
+            {'playlist': playlist, 'market': market_code, 'ts': timestamp},
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+        )
+
+    def save_raw_data(
+        self,
+        data: Dict,
+        market_code: str,
+        timestamp: Optional[str] = None
+    ) -> str:
+        """Save raw playlists to a JSONL file, one playlist per line"""
+        timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+        filepath = self._raw_data_path(market_code, timestamp)
         
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            with open(filepath, 'ab') as f:
+                for playlist in data.get('playlists', []):
+                    f.write(self._raw_record(playlist, market_code, timestamp))
             logger.info(f"Raw data saved to {filepath}")
             return filepath
         except Exception as e:
             logger.error(f"Error saving raw data: {str(e)}")
             raise
 
+    def append_raw_playlist(self, playlist: Dict, market_code: str, timestamp: str) -> str:
+        """Append a single playlist to the raw JSONL file of a market run"""
+        filepath = self._raw_data_path(market_code, timestamp)
+        
+        try:
+            with open(filepath, 'ab') as f:
+                f.write(self._raw_record(playlist, market_code, timestamp))
+            logger.debug(f"Appended playlist {playlist.get('id')} to {filepath}")
+            return filepath
+        except Exception as e:
+            logger.error(f"Error saving raw data: {str(e)}")
+            raise
+
+    def load_raw_data(self, filepath: str) -> pd.DataFrame:
+        """Load a raw JSONL file, one row per playlist"""
+        return pd.read_json(filepath, lines=True)
+
     def process_playlist_data(self, playlist_data: List[Dict]) -> pd.DataFrame:
         """Convert playlist data to DF with genre information"""
         try:
-            processed_data = []
+            playlists = [
+                playlist for playlist in playlist_data
+                if isinstance(playlist, dict)
+            ]
+            
+            #Count tracks first so that columns can be preallocated
+            n = sum(
+                _is_track(track)
+                for playlist in playlists
+                for track in playlist.get('tracks', [])
+            )
+            
+            if not n:
+                logger.warning("No data to process")
+                return pd.DataFrame()
             
-            for playlist in playlist_data:
-                if not isinstance(playlist, dict):
-                    continue
-                    
+            playlist_names = [None] * n
+            playlist_ids = [None] * n
+            track_names = [None] * n
+            track_ids = [None] * n
+            artist_names = [None] * n
+            genres = [None] * n
+            genre_tokens = [None] * n
+            popularity = np.empty(n, dtype=np.int8)  #Spotify popularity is 0-100
+            explicit = np.empty(n, dtype=bool)
+            duration_ms = np.empty(n, dtype=np.int32)
+            
+            i = 0
+            for playlist in playlists:
                 playlist_name = playlist.get('name', 'Unknown')
                 playlist_id = playlist.get('id', 'Unknown')
-                tracks = playlist.get('tracks', [])
                 
-                for track in tracks:
-                    if not isinstance(track, dict):
+                for track in playlist.get('tracks', []):
+                    if not _is_track(track):
                         continue
+                    get = track.get if isinstance(track, dict) else partial(getattr, track)
                         
                     #Extract basic track info
-                    track_info = {
-                        'playlist_name': playlist_name,
-                        'playlist_id': playlist_id,
-                        'track_name': track.get('name', 'Unknown'),
-                        'track_id': track.get('id', 'Unknown'),
-                        'artists': ', '.join([
-                            artist.get('name', 'Unknown') 
-                            for artist in track.get('artists', [])
-                            if isinstance(artist, dict)
-                        ]),
-                        'popularity': track.get('popularity', 0),
-                        'explicit': track.get('explicit', False),
-                        'duration_ms': track.get('duration_ms', 0),
-                    }
+                    playlist_names[i] = playlist_name
+                    playlist_ids[i] = playlist_id
+                    track_names[i] = get('name', 'Unknown')
+                    track_ids[i] = get('id', 'Unknown')
+                    artist_names[i] = ', '.join([
+                        artist.get('name', 'Unknown') 
+                        for artist in get('artists', [])
+                        if isinstance(artist, dict)
+                    ])
+                    popularity[i] = get('popularity', 0) or 0
+                    explicit[i] = bool(get('explicit', False))
+                    duration_ms[i] = get('duration_ms', 0) or 0
                     
-                    #Add genres as a comma separated string
-                    track_genres = track.get('genres', [])
-                    if isinstance(track_genres, list):
-                        track_info['genres'] = ', '.join(track_genres)
+                    #Add genres as a comma separated string, plus the tokens it splits into
+                    track_genres = get('genres', [])
+                    if isinstance(track_genres, (list, tuple)) and track_genres:
+                        genres[i] = ', '.join(track_genres)
+                        genre_tokens[i] = tuple(track_genres)
                     else:
-                        track_info['genres'] = ''
-                    
-                    processed_data.append(track_info)
-            
-            if not processed_data:
-                logger.warning("No data to process")
-                return pd.DataFrame()
-            
-            df = pd.DataFrame(processed_data)
+                        genres[i] = ''
+                        genre_tokens[i] = ('',)
+                    i += 1
+            
+            df = pd.DataFrame({
+                'playlist_name': pd.Categorical(playlist_names),
+                'playlist_id': pd.Categorical(playlist_ids),
+                'track_name': track_names,
+                'track_id': track_ids,
+                'artists': artist_names,
+                'popularity': popularity,
+                'explicit': explicit,
+                'duration_ms': duration_ms,
+                'genres': genres,
+                'genre_tokens': genre_tokens,
+            })
             
             #Add derived metrics
+            #Literal separator counts, avoiding the regex engine behind str.count
             if 'artists' in df.columns:
-                df['artist_count'] = df['artists'].str.count(',') + 1
+                df['artist_count'] = (
+                    np.char.count(df['artists'].to_numpy(dtype=str), ',') + 1
+                ).astype(np.int16)
             
             if 'genres' in df.columns:
-                df['genre_count'] = df['genres'].str.count(',') + 1
+                df['genre_count'] = (
+                    np.char.count(df['genres'].to_numpy(dtype=str), ', ') + 1
+                ).astype(np.int16)
             
             #Calculate genre statistics
-            if 'genres' in df.columns and len(df) > 0:
-                all_genres = df['genres'].str.split(', ').explode()
+            if 'genre_tokens' in df.columns and len(df) > 0:
+                all_genres = df['genre_tokens'].explode()
                 genre_counts = all_genres.value_counts()
                 
                 logger.info(f"Found {len(genre_counts)} unique genres")
@@ -101,10 +174,15 @@ class DataProcessor:
             logger.error(f"Error processing playlist data: {str(e)}")
             raise
 
-    def save_processed_data(self, df: pd.DataFrame, market_code: str) -> str:
-        """Save processed DataFrame to CSV."""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{market_code}_processed_{timestamp}.csv"
+    def save_processed_data(
+        self,
+        df: pd.DataFrame,
+        market_code: str,
+        timestamp: Optional[str] = None
+    ) -> str:
+        """Save processed DataFrame to zstd-compressed Parquet."""
+        timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"{market_code}_processed_{timestamp}.parquet"
         filepath = os.path.join(self.processed_data_dir, filename)
         
         try:
@@ -116,7 +194,10 @@ class DataProcessor:
                     'genres', 'artist_count', 'genre_count'
                 ])
             
-            df.to_csv(filepath, index=False, encoding='utf-8')
+            #genre_tokens holds tuples pyarrow can't store, and is rebuilt from genres anyway
+            df.drop(columns='genre_tokens', errors='ignore').to_parquet(
+                filepath, engine='pyarrow', compression='zstd', index=False
+            )
             logger.info(f"Processed data saved to {filepath}")
             return filepath
             
@@ -130,7 +211,10 @@ class DataProcessor:
             if 'genres' not in df.columns or df.empty:
                 return {}
             
-            genre_series = df['genres'].str.split(', ').explode()
+            if 'genre_tokens' in df.columns:
+                genre_series = df['genre_tokens'].explode()
+            else:
+                genre_series = df['genres'].str.split(', ').explode()
             genre_counts = genre_series.value_counts()
             
             total_tracks = len(df)
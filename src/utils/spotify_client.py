@@ -1,61 +1,319 @@
 import spotipy
+import numpy as np
 from spotipy.oauth2 import SpotifyClientCredentials
-from typing import Dict, List, Optional, Set
+from spotipy.exceptions import SpotifyException
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+from typing import Dict, List, Optional, Set, Tuple
 import logging
+import os
+import threading
 import time
-from collections import defaultdict
+import heapq
+from collections import Counter, namedtuple
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import chain
+from operator import itemgetter
 import concurrent.futures
+from cachetools import LRUCache
+import diskcache
+import requests
+from urllib3.util.retry import Retry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+#Shared pool for concurrent, I/O bound API requests
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+#Keep-alive connections to the API, sized for the fetch pool plus the
+#playlist threads that call into it
+HTTP_POOL_SIZE = 32
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+#Shared, immutable genre list for artists without genres
+EMPTY_GENRES: Tuple[str, ...] = ()
+
+#Persistent genre cache limits, genres are refreshed after 30 days
+GENRE_DISK_CACHE_SIZE = 100 * 1024 * 1024
+GENRE_DISK_CACHE_TTL = 30 * 24 * 60 * 60
+
+#Projection for playlist track pages, paging fields plus what get_playlist_tracks reads
+_TRACK_FIELDS = (
+    'next,total,limit,offset,'
+    'items(track(id,name,artists(id,name,uri),album(name),'
+    'popularity,explicit,duration_ms,external_urls.spotify))'
+)
+
+#Default request budget of a client, shared by all of its threads. Clients
+#don't coordinate, so split the budget when several run at once
+REQUESTS_PER_SECOND = 10
+
+#Rate limits and transient server errors are worth retrying, anything else is not
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+#Longest a single retry may wait, whatever Retry-After asks for
+MAX_RETRY_WAIT = 60
+
+_backoff = wait_exponential_jitter(initial=1, max=MAX_RETRY_WAIT)
+
+def _is_retryable(exc: BaseException) -> bool:
+    return isinstance(exc, SpotifyException) and exc.http_status in RETRYABLE_STATUSES
+
+def _wait_retry_after(retry_state) -> float:
+    """Wait as long as Retry-After asks (capped), else back off exponentially with jitter."""
+    headers = getattr(retry_state.outcome.exception(), 'headers', None) or {}
+    try:
+        return min(max(float(headers['Retry-After']), 0), MAX_RETRY_WAIT)
+    except (KeyError, TypeError, ValueError):
+        return _backoff(retry_state)
+
+#Applied to every Spotify API call
+retry_spotify = retry(
+    retry=retry_if_exception(_is_retryable),
+    wait=_wait_retry_after,
+    stop=stop_after_attempt(6),
+    reraise=True
+)
+
+class LeakyBucket:
+    """Thread safe rate limiter, lets through at most rate_per_s calls per second."""
+
+    def __init__(self, rate_per_s: float):
+        if rate_per_s <= 0:
+            raise ValueError(f"rate_per_s must be positive, got {rate_per_s}")
+        self._rate = rate_per_s
+        self._tokens = rate_per_s
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Take a token, waiting only as long as the bucket needs to refill."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._rate, self._tokens + (now - self._last) * self._rate)
+            self._last = now
+            #Going negative reserves a slot, so concurrent callers queue up in turn
+            self._tokens -= 1
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+@dataclass
+class Track:
+    """A playlist track with the genres of its artists."""
+    #Declared by hand, dataclass(slots=True) needs Python 3.10
+    __slots__ = (
+        'id', 'name', 'artists', 'album', 'popularity',
+        'explicit', 'duration_ms', 'external_urls', 'genres'
+    )
+    id: str
+    name: str
+    artists: List[Dict]
+    album: str
+    popularity: int
+    explicit: bool
+    duration_ms: int
+    external_urls: str
+    genres: List[str]
+
+def _slim_playlist(playlist: Dict) -> Dict:
+    """Keep only the playlist fields used downstream."""
+    followers = playlist.get('followers')
+    return {
+        'id': playlist['id'],
+        'name': playlist.get('name', 'Unknown'),
+        'description': playlist.get('description', ''),
+        'followers_total': followers.get('total', 0) if isinstance(followers, dict) else 0,
+        'owner_id': (playlist.get('owner') or {}).get('id'),
+        'tracks_total': (playlist.get('tracks') or {}).get('total', 0)
+    }
+
+def _build_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """HTTP session with a larger connection pool, retrying only failed connections.
+
+    Status retries (429/5xx) are left to retry_spotify, so they happen once,
+    see the Retry-After header and draw from the rate limiter.
+    """
+    retry = Retry(
+        total=3,
+        connect=3,
+        read=3,
+        allowed_methods=frozenset(['GET']),
+        status=0,
+        status_forcelist=(),
+        backoff_factor=0.3,
+        respect_retry_after_header=False
+    )
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+@lru_cache(maxsize=128)
+def _ranked_genres(
+    track_genres: Tuple[Tuple[str, ...], ...]
+) -> Tuple[Tuple[Tuple[str, int], ...], Tuple[float, ...]]:
+    """Genres most common first with their track percentages, memoized in immutable form."""
+    total_tracks = len(track_genres)
+    ranked = tuple(Counter(chain.from_iterable(track_genres)).most_common())
+    
+    #Percentages in one vectorized divide
+    counts = np.fromiter((count for _, count in ranked), dtype=np.int64, count=len(ranked))
+    percentages = (
+        counts / total_tracks * 100 if total_tracks > 0
+        else np.zeros(len(ranked))
+    )
+    return ranked, tuple(percentages.tolist())
+
 class SpotifyClient:
-    def __init__(self, client_id: str, client_secret: str):
+    def __init__(
+        self,
+        client_id: str,
+        client_secret: str,
+        genre_cache_size: int = 50000,
+        genre_cache_dir: Optional[str] = None,
+        requests_per_second: float = REQUESTS_PER_SECOND
+    ):
         try:
             auth_manager = SpotifyClientCredentials(
                 client_id=client_id,
                 client_secret=client_secret
             )
-            self.client = spotipy.Spotify(auth_manager=auth_manager)
-            self.artist_genre_cache = {}
+            self.client = spotipy.Spotify(
+                auth_manager=auth_manager,
+                requests_session=_build_session()
+            )
+            #One budget for every API call of this client, whichever thread makes it
+            self._bucket = LeakyBucket(requests_per_second)
+            #Bounded so long running analyses don't grow the cache forever
+            self.artist_genre_cache = LRUCache(maxsize=genre_cache_size)
+            self._cache_lock = threading.Lock()
+            self._cache_hits = 0
+            self._cache_misses = 0
+            #Optional on-disk tier so genres survive across runs
+            self._disk_cache = (
+                diskcache.Cache(
+                    os.path.expanduser(genre_cache_dir),
+                    size_limit=GENRE_DISK_CACHE_SIZE
+                )
+                if genre_cache_dir else None
+            )
             logger.info("Successfully initialized Spotify client")
         except Exception as e:
             logger.error(f"Failed to initialize Spotify client: {str(e)}")
             raise
 
-    def get_artist_genres_batch(self, artist_ids: List[str]) -> Dict[str, List[str]]:
+    def cache_info(self) -> CacheInfo:
+        """Hit/miss statistics of the artist genre cache."""
+        with self._cache_lock:
+            return CacheInfo(
+                self._cache_hits,
+                self._cache_misses,
+                self.artist_genre_cache.maxsize,
+                self.artist_genre_cache.currsize
+            )
+
+    @retry_spotify
+    def _artists(self, artist_ids: List[str]) -> Dict:
+        """Fetch up to 50 artists in one request."""
+        self._bucket.acquire()
+        return self.client.artists(artist_ids)
+
+    def get_artist_genres_batch(self, artist_ids: List[str]) -> Dict[str, Tuple[str, ...]]:
         """Get genres for multiple artists in one batch."""
-        uncached_ids = [aid for aid in artist_ids if aid not in self.artist_genre_cache]
+        cached = {}
+        with self._cache_lock:
+            for aid in artist_ids:
+                genres = self.artist_genre_cache.get(aid)
+                if genres is not None:
+                    cached[aid] = genres
+        
+        uncached_ids = [aid for aid in artist_ids if aid not in cached]
+        
+        #Fall back to the on-disk cache before calling the API
+        if uncached_ids and self._disk_cache is not None:
+            from_disk = {}
+            for aid in uncached_ids:
+                genres = self._disk_cache.get(aid)
+                if genres is not None:
+                    from_disk[aid] = tuple(genres)
+            if from_disk:
+                with self._cache_lock:
+                    self.artist_genre_cache.update(from_disk)
+                cached.update(from_disk)
+                uncached_ids = [aid for aid in uncached_ids if aid not in from_disk]
+        
+        with self._cache_lock:
+            self._cache_hits += len(artist_ids) - len(uncached_ids)
+            self._cache_misses += len(uncached_ids)
         
         if not uncached_ids:
-            return {aid: self.artist_genre_cache[aid] for aid in artist_ids}
+            return {aid: cached[aid] for aid in artist_ids}
             
         try:
-            #Split into batches of 50
-            batch_results = {}
-            for i in range(0, len(uncached_ids), 50):
-                batch = uncached_ids[i:i+50]
-                artists = self.client.artists(batch)['artists']
-                
-                for artist in artists:
+            #Split into batches of 50 and fetch them concurrently
+            batches = [
+                uncached_ids[i:i+50]
+                for i in range(0, len(uncached_ids), 50)
+            ]
+            fetched = {}
+            for response in _executor.map(self._artists, batches):
+                for artist in response['artists']:
                     if artist:
-                        aid = artist['id']
-                        genres = artist.get('genres', [])
-                        self.artist_genre_cache[aid] = genres
-                        batch_results[aid] = genres
-                
-                if i + 50 < len(uncached_ids):
-                    time.sleep(0.1)  #Limit the rate between batches
+                        fetched[artist['id']] = tuple(artist.get('genres', EMPTY_GENRES))
+            
+            with self._cache_lock:
+                self.artist_genre_cache.update(fetched)
+            if self._disk_cache is not None:
+                with self._disk_cache.transact():
+                    for aid, genres in fetched.items():
+                        self._disk_cache.set(aid, genres, expire=GENRE_DISK_CACHE_TTL)
+            cached.update(fetched)
             
             #Combine with results that are cached
             return {
-                aid: self.artist_genre_cache.get(aid, [])
+                aid: cached.get(aid, EMPTY_GENRES)
                 for aid in artist_ids
             }
             
         except Exception as e:
             logger.warning(f"Error in batch genre fetch: {str(e)}")
-            return {aid: [] for aid in artist_ids}
+            return {aid: EMPTY_GENRES for aid in artist_ids}
+
+    @retry_spotify
+    def _search(self, term: str, country_code: str) -> Dict:
+        """Run one playlist search request."""
+        self._bucket.acquire()
+        return self.client.search(
+            q=term,
+            type='playlist',
+            market=country_code,
+            limit=10
+        )
+
+    def _search_playlists(self, term: str, country_code: str) -> List[Dict]:
+        """Search playlists for a single term in a market."""
+        try:
+            results = self._search(term, country_code)
+        except Exception as e:
+            logger.warning(f"Playlist search for '{term}' failed: {str(e)}")
+            return []
+        
+        if results and 'playlists' in results:
+            #Project to slim dicts right away instead of holding full playlist objects
+            return [
+                _slim_playlist(playlist)
+                for playlist in results['playlists'].get('items', [])
+                if isinstance(playlist, dict) and 'id' in playlist
+            ]
+        return []
 
     def get_market_playlists(self, country_code: str, limit: int = 20) -> List[Dict]:
         try:
@@ -64,62 +322,71 @@ class SpotifyClient:
                 'trending', 'viral', 'best'
             ]
             
+            #Run the searches concurrently
             all_playlists = []
-            for term in search_terms[:3]: 
-                try:
-                    results = self.client.search(
-                        q=term,
-                        type='playlist',
-                        market=country_code,
-                        limit=10
-                    )
-                    
-                    if results and 'playlists' in results:
-                        items = results['playlists'].get('items', [])
-                        all_playlists.extend(items)
-                    
-                    time.sleep(0.1)
-                except Exception as e:
-                    continue
+            for items in _executor.map(
+                lambda term: self._search_playlists(term, country_code),
+                search_terms[:3]
+            ):
+                all_playlists.extend(items)
             
-            #Remove duplicate playlists and then sort
+            #Remove duplicate playlists and keep the most followed ones.
+            #_search_playlists already dropped null and id-less items
             unique_playlists = list({
-                playlist['id']: playlist 
-                for playlist in all_playlists 
-                if isinstance(playlist, dict) and 'id' in playlist
+                playlist['id']: playlist
+                for playlist in all_playlists
             }.values())
             
-            unique_playlists.sort(
-                key=lambda x: (
-                    x.get('followers', {}).get('total', 0) 
-                    if isinstance(x.get('followers'), dict) else 0
-                ),
-                reverse=True
+            return heapq.nlargest(
+                limit,
+                unique_playlists,
+                key=itemgetter('followers_total')
             )
             
-            return unique_playlists[:limit]
-            
         except Exception as e:
             logger.error(f"Error fetching playlists: {str(e)}")
             return []
 
-    def get_playlist_tracks(self, playlist_id: str, limit: int = 30) -> List[Dict]:
+    @retry_spotify
+    def _playlist_page(self, playlist_id: str, limit: int, offset: int = 0) -> Dict:
+        """Fetch one page of playlist tracks."""
+        self._bucket.acquire()
+        return self.client.playlist_items(
+            playlist_id,
+            limit=limit,
+            offset=offset,
+            fields=_TRACK_FIELDS,
+            additional_types=('track',)
+        )
+
+    def get_playlist_tracks(self, playlist_id: str, limit: Optional[int] = None) -> List[Track]:
+        """Get playlist tracks with artist genres, up to limit tracks (all by default)."""
+        if limit is not None and limit <= 0:
+            raise ValueError(f"limit must be positive, got {limit}")
+        
         try:
             tracks = []
-            results = self.client.playlist_tracks(
-                playlist_id, 
-                limit=limit,
-                fields='items(track(id,name,artists(id,name,uri),album(name),popularity,explicit,duration_ms,external_urls))'
-            )
+            page_size = 100 if limit is None else min(limit, 100)
+            results = self._playlist_page(playlist_id, page_size)
             
             if not results or 'items' not in results:
                 return []
             
-            #Collect all unique artist IDs
-            artist_ids = set()
+            #The first page tells how many tracks there are, fetch the rest concurrently
+            items = results['items']
+            total = results.get('total', len(items))
+            if limit is not None:
+                total = min(total, limit)
+            for page in _executor.map(
+                lambda offset: self._playlist_page(playlist_id, page_size, offset),
+                range(page_size, total, page_size)
+            ):
+                if page:
+                    items.extend(page.get('items', []))
+            
             track_data = []
             
-            for item in results['items'][:limit]:
+            for item in items[:limit]:
                 if not item or 'track' not in item:
                     continue
                     
@@ -137,35 +404,39 @@ class SpotifyClient:
                     if artist and artist.get('id')
                 ]
                 
-                artist_ids.update(artist['id'] for artist in artists)
-                
                 track_data.append({
                     'track': track,
                     'artists': artists
                 })
             
-            #Fetch genres for all artists in batches
+            #Collect all unique artist IDs and fetch their genres in batches
+            artist_ids = {
+                artist['id']
+                for data in track_data
+                for artist in data['artists']
+            }
             artist_genres = self.get_artist_genres_batch(list(artist_ids))
             
             #Construct final track data with genres
             for data in track_data:
                 track = data['track']
-                track_genres = []
-                
-                for artist in data['artists']:
-                    track_genres.extend(artist_genres.get(artist['id'], []))
+                #Ordered dedup keeps genres in artist order, deterministic across runs
+                track_genres = dict.fromkeys(chain.from_iterable(
+                    artist_genres.get(artist['id'], EMPTY_GENRES)
+                    for artist in data['artists']
+                ))
                 
-                tracks.append({
-                    'id': track.get('id', 'Unknown'),
-                    'name': track.get('name', 'Unknown'),
-                    'artists': data['artists'],
-                    'album': track.get('album', {}).get('name', 'Unknown'),
-                    'popularity': track.get('popularity', 0),
-                    'explicit': track.get('explicit', False),
-                    'duration_ms': track.get('duration_ms', 0),
-                    'external_urls': track.get('external_urls', {}).get('spotify', ''),
-                    'genres': list(set(track_genres))
-                })
+                tracks.append(Track(
+                    id=track.get('id', 'Unknown'),
+                    name=track.get('name', 'Unknown'),
+                    artists=data['artists'],
+                    album=track.get('album', {}).get('name', 'Unknown'),
+                    popularity=track.get('popularity', 0),
+                    explicit=track.get('explicit', False),
+                    duration_ms=track.get('duration_ms', 0),
+                    external_urls=track.get('external_urls', {}).get('spotify', ''),
+                    genres=list(track_genres)
+                ))
             
             return tracks
             
@@ -173,28 +444,19 @@ class SpotifyClient:
             logger.error(f"Error fetching tracks: {str(e)}")
             return []
 
-    def analyze_genre_distribution(self, tracks: List[Dict]) -> Dict:
-        genre_counts = defaultdict(int)
-        total_tracks = len(tracks)
-        
-        for track in tracks:
-            for genre in track.get('genres', []):
-                genre_counts[genre] += 1
+    def analyze_genre_distribution(self, tracks: List[Track]) -> Dict:
+        #Re-analyzing the same tracks is served from the memo, the dicts are built
+        #per call so callers never share mutable results
+        ranked, percentages = _ranked_genres(tuple(tuple(track.genres) for track in tracks))
         
-        genre_distribution = {
-            genre: {
-                'count': count,
-                'percentage': (count / total_tracks) * 100 if total_tracks > 0 else 0
+        return {
+            'total_tracks': len(tracks),
+            'unique_genres': len(ranked),
+            'genre_distribution': {
+                genre: {
+                    'count': count,
+                    'percentage': percentage
+                }
+                for (genre, count), percentage in zip(ranked, percentages)
             }
-            for genre, count in genre_counts.items()
         }
-        
-        return {
-            'total_tracks': total_tracks,
-            'unique_genres': len(genre_counts),
-            'genre_distribution': dict(sorted(
-                genre_distribution.items(),
-                key=lambda x: x[1]['count'],
-                reverse=True
-            ))
-        }
\ No newline at end of file
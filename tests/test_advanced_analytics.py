@@ -0,0 +1,113 @@
+import pytest
+import pandas as pd
+from src.utils.advanced_analytics import AdvancedAnalytics
+
+@pytest.fixture
+def analytics():
+    return AdvancedAnalytics()
+
+def test_analyze_content_gaps(analytics):
+    df = pd.DataFrame({
+        'track_id': ['t1', 't2'],
+        'popularity': [80, 60],
+        'genres': ['pop, bollywood', 'rock']
+    })
+    
+    gaps = analytics.analyze_content_gaps(df, 'IN')
+    by_category = {gap['category']: gap for gap in gaps['genre_gaps']}
+    assert by_category['pop']['status'] == 'present'
+    assert by_category['pop']['present_genres'] == ['pop']
+    assert by_category['classical']['status'] == 'missing'
+    assert by_category['classical']['gap_size'] == 100
+    assert gaps['local_content']['present_genres'] == ['bollywood']
+
+def test_cluster_genres_small_input(analytics):
+    df = pd.DataFrame({
+        'track_id': ['t1', 't2', 't3'],
+        'popularity': [90, 50, 10],
+        'genres': ['pop', 'rock, pop', 'folk']
+    })
+    
+    clusters = analytics.cluster_genres(df, n_clusters=2)
+    genres = {
+        info['genre']: info
+        for cluster in clusters.values()
+        for info in cluster
+    }
+    assert set(genres) == {'pop', 'rock', 'folk'}
+    assert genres['pop']['count'] == 2
+    assert genres['pop']['tracks'] == ['t1', 't2']
+    assert len(clusters) <= 2
+
+def _blob_genres_df():
+    """24 genres in two well separated groups: rare and unpopular vs common and popular"""
+    rare = [(f'rare_{i}', f'rare_{i}', 10) for i in range(12)]
+    common = [
+        (f'common_{i}_{j}', f'common_{i}', 90)
+        for i in range(12)
+        for j in range(10)
+    ]
+    track_ids, genres, popularity = zip(*(rare + common))
+    return pd.DataFrame({
+        'track_id': list(track_ids),
+        'popularity': list(popularity),
+        'genres': list(genres)
+    })
+
+@pytest.mark.parametrize('cache_dir', [None, 'tmp'])
+def test_cluster_genres_kmeans_separates_blobs(cache_dir, tmp_path):
+    analytics = AdvancedAnalytics(str(tmp_path) if cache_dir else None)
+    df = _blob_genres_df()
+    
+    #The second run is served from the joblib cache when one is configured
+    for _ in range(2):
+        clusters = analytics.cluster_genres(df, n_clusters=2, include_tracks=False)
+        groups = sorted(
+            sorted(info['genre'] for info in cluster)
+            for cluster in clusters.values()
+        )
+        assert groups == [
+            sorted(f'common_{i}' for i in range(12)),
+            sorted(f'rare_{i}' for i in range(12))
+        ]
+
+def test_opportunity_score_counts_tracks_on_duplicate_index(analytics):
+    day = pd.DataFrame({
+        'track_id': ['t1', 't2'],
+        'popularity': [80, 60],
+        'genres': ['bollywood', 'rock']
+    })
+    df = pd.concat([day, day])
+    
+    opportunity = analytics.calculate_opportunity_score(df, 'IN', 1000, 0.5)
+    assert opportunity['contributing_factors']['local_percentage'] == 50.0
+
+def test_explode_genres_skips_tracks_without_tokens(analytics):
+    df = pd.DataFrame({
+        'track_id': ['t1', 't2'],
+        'popularity': [80, 60],
+        'genres': ['pop', ''],
+        'genre_tokens': [('pop',), ()]
+    })
+    
+    genres_exploded = analytics._explode_genres(df)
+    assert analytics._count_genres(genres_exploded).to_dict() == {'pop': 1}
+
+def test_cluster_genres_on_duplicate_index(analytics):
+    day = pd.DataFrame({
+        'track_id': ['t1', 't2'],
+        'popularity': [80, 40],
+        'genres': ['pop, rock', 'rock']
+    })
+    df = pd.concat([day, day])
+    
+    clusters = analytics.cluster_genres(df, n_clusters=2)
+    genres = {
+        info['genre']: info
+        for cluster in clusters.values()
+        for info in cluster
+    }
+    assert genres['pop']['count'] == 2
+    assert genres['rock']['count'] == 4
+    assert genres['rock']['popularity'] == 60.0
+    assert genres['rock']['tracks'] == ['t1', 't2', 't1', 't2']
@@ -25,4 +25,40 @@ def test_process_playlist_data(data_processor):
     df = data_processor.process_playlist_data(test_data)
     assert isinstance(df, pd.DataFrame)
     assert len(df) == 1
-    assert df.iloc[0]['track_name'] == 'Test Track'
\ No newline at end of file
+    assert df.iloc[0]['track_name'] == 'Test Track'
+
+def test_save_raw_data_writes_one_line_per_playlist(data_processor):
+    data = {'playlists': [
+        {'name': 'Playlist A', 'id': 'a', 'tracks': []},
+        {'name': 'Playlist B', 'id': 'b', 'tracks': []}
+    ]}
+    
+    filepath = data_processor.save_raw_data(data, 'IN', '20250101_000000')
+    assert filepath.endswith('.jsonl')
+    
+    raw = data_processor.load_raw_data(filepath)
+    assert len(raw) == 2
+    assert list(raw['market']) == ['IN', 'IN']
+
+def test_processed_data_round_trips_through_parquet(data_processor):
+    test_data = [{
+        'name': 'Test Playlist',
+        'id': 'test_id',
+        'tracks': [{
+            'name': 'Test Track',
+            'id': 'track_1',
+            'artists': [{'name': 'Test Artist'}],
+            'popularity': 80,
+            'explicit': False,
+            'duration_ms': 200000,
+            'genres': ['pop', 'dance pop']
+        }]
+    }]
+    
+    df = data_processor.process_playlist_data(test_data)
+    filepath = data_processor.save_processed_data(df, 'IN', '20250101_000000')
+    
+    saved = pd.read_parquet(filepath)
+    assert len(saved) == 1
+    assert saved.iloc[0]['genres'] == 'pop, dance pop'
+    assert 'genre_tokens' not in saved.columns
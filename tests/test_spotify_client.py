@@ -1,6 +1,9 @@
 import pytest
-from src.utils.spotify_client import SpotifyClient
+from src.utils.spotify_client import LeakyBucket, SpotifyClient, Track
+from spotipy.exceptions import SpotifyException
 from unittest.mock import Mock, patch
+import diskcache
+import time
 
 @pytest.fixture
 def spotify_client():
@@ -12,3 +15,114 @@ def test_get_featured_playlists(spotify_client):
         playlists = spotify_client.get_featured_playlists('IN', 1)
         assert len(playlists) == 1
         assert playlists[0]['name'] == 'Test Playlist'
+
+def test_artist_genres_served_from_cache(spotify_client):
+    spotify_client.client = Mock()
+    spotify_client.client.artists.return_value = {
+        'artists': [{'id': 'artist_1', 'genres': ['pop']}]
+    }
+    
+    assert spotify_client.get_artist_genres_batch(['artist_1']) == {'artist_1': ('pop',)}
+    assert spotify_client.get_artist_genres_batch(['artist_1']) == {'artist_1': ('pop',)}
+    assert spotify_client.client.artists.call_count == 1
+    
+    info = spotify_client.cache_info()
+    assert info.hits == 1
+    assert info.misses == 1
+
+def test_leaky_bucket_waits_only_past_the_rate():
+    bucket = LeakyBucket(20)
+    
+    start = time.monotonic()
+    for _ in range(20):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+    
+    bucket.acquire()
+    bucket.acquire()
+    assert time.monotonic() - start >= 0.09
+
+def test_leaky_bucket_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        LeakyBucket(0)
+
+def test_genre_distribution_ranks_most_common_first(spotify_client):
+    tracks = [
+        Track('t1', 'Track 1', [], 'Album', 50, False, 200000, '', ['rock', 'pop']),
+        Track('t2', 'Track 2', [], 'Album', 60, False, 180000, '', ['pop'])
+    ]
+    
+    result = spotify_client.analyze_genre_distribution(tracks)
+    assert result['total_tracks'] == 2
+    assert result['unique_genres'] == 2
+    assert list(result['genre_distribution']) == ['pop', 'rock']
+    assert result['genre_distribution']['pop'] == {'count': 2, 'percentage': 100.0}
+    assert result['genre_distribution']['rock']['percentage'] == 50.0
+
+def test_rate_limited_call_is_retried_after_retry_after(spotify_client):
+    spotify_client.client = Mock()
+    spotify_client.client.artists.side_effect = [
+        SpotifyException(429, -1, 'x', headers={'Retry-After': '0'}),
+        {'artists': [{'id': 'artist_1', 'genres': ['pop']}]}
+    ]
+    
+    assert spotify_client.get_artist_genres_batch(['artist_1']) == {'artist_1': ('pop',)}
+    assert spotify_client.client.artists.call_count == 2
+
+def test_memoized_genre_distribution_is_not_shared(spotify_client):
+    tracks = [Track('t1', 'Track 1', [], 'Album', 50, False, 200000, '', ['jazz'])]
+    
+    first = spotify_client.analyze_genre_distribution(tracks)
+    first['genre_distribution'].pop('jazz')
+    second = spotify_client.analyze_genre_distribution(tracks)
+    
+    assert second['genre_distribution'] == {'jazz': {'count': 1, 'percentage': 100.0}}
+    assert second is not first
+
+def _fake_playlist_page(total):
+    def page(playlist_id, limit, offset=0):
+        return {
+            'total': total,
+            'items': [
+                {'track': {'id': f'track_{i}', 'artists': []}}
+                for i in range(offset, min(offset + limit, total))
+            ]
+        }
+    return Mock(side_effect=page)
+
+@pytest.mark.parametrize('limit, offsets, expected', [
+    (None, [0, 100, 200], 250),
+    (150, [0, 100], 150)
+])
+def test_get_playlist_tracks_pages_in_order(spotify_client, limit, offsets, expected):
+    spotify_client._playlist_page = _fake_playlist_page(250)
+    
+    tracks = spotify_client.get_playlist_tracks('playlist_id', limit)
+    
+    requested = sorted(call.args[2] if len(call.args) > 2 else 0
+                       for call in spotify_client._playlist_page.call_args_list)
+    assert requested == offsets
+    assert [track.id for track in tracks] == [f'track_{i}' for i in range(expected)]
+
+def test_get_playlist_tracks_rejects_non_positive_limit(spotify_client):
+    with pytest.raises(ValueError):
+        spotify_client.get_playlist_tracks('playlist_id', 0)
+
+def test_artist_genres_persist_on_disk_across_clients(tmp_path):
+    first = SpotifyClient('test_client_id', 'test_client_secret', genre_cache_dir=str(tmp_path))
+    first.client = Mock()
+    first.client.artists.return_value = {
+        'artists': [{'id': 'artist_1', 'genres': ['pop']}]
+    }
+    first.get_artist_genres_batch(['artist_1'])
+    
+    #An older run stored genres as lists
+    with diskcache.Cache(str(tmp_path)) as cache:
+        cache.set('artist_2', ['rock'])
+    
+    second = SpotifyClient('test_client_id', 'test_client_secret', genre_cache_dir=str(tmp_path))
+    second.client = Mock()
+    genres = second.get_artist_genres_batch(['artist_1', 'artist_2'])
+    
+    assert genres == {'artist_1': ('pop',), 'artist_2': ('rock',)}
+    second.client.artists.assert_not_called()